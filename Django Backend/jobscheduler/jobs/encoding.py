@@ -0,0 +1,61 @@
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Websocket subprotocols a dashboard can ask for at connect time. Without one
+# the consumer keeps sending a verbose JSON message per request.
+COLUMNAR = 'jobs.columnar.v1'
+MSGPACK = 'jobs.msgpack.v1'
+
+
+def supported_subprotocols():
+    if msgpack is None:
+        return [COLUMNAR]
+    return [MSGPACK, COLUMNAR]
+
+
+def negotiate(offered):
+    # The client lists subprotocols in order of preference
+    supported = supported_subprotocols()
+    for subprotocol in offered:
+        if subprotocol in supported:
+            return subprotocol
+    return None
+
+
+def to_columnar(rows):
+    """Turns a list of serialized jobs into field names sent once plus value rows."""
+    if not rows:
+        return {'columns': [], 'rows': []}
+    columns = list(rows[0].keys())
+    return {
+        'columns': columns,
+        'rows': [[row[column] for column in columns] for row in rows],
+    }
+
+
+def compact_message(message):
+    if 'jobs' in message:
+        message = {**message, 'jobs': to_columnar(message['jobs'])}
+    return message
+
+
+def decode_request(subprotocol, text_data=None, bytes_data=None):
+    if bytes_data is not None and subprotocol == MSGPACK:
+        return msgpack.unpackb(bytes_data)
+    return json.loads(text_data if text_data is not None else bytes_data)
+
+
+def encode_frame(subprotocol, messages):
+    """Packs every message of one tick into a single frame.
+
+    Returns the keyword arguments for AsyncWebsocketConsumer.send.
+    """
+    frame = {'messages': [compact_message(message) for message in messages]}
+    if subprotocol == MSGPACK:
+        return {'bytes_data': msgpack.packb(frame)}
+    return {'text_data': json.dumps(frame, separators=(',', ':'))}
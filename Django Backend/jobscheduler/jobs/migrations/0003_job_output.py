@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0002_alter_job_created_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='output_content_type',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='output_digest',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='output_size',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
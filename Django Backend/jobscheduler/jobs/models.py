@@ -17,6 +17,10 @@ class Job(models.Model):
     execution_time=models.IntegerField(default=0)
     user=models.ForeignKey(User, on_delete=models.CASCADE)
     created_date=models.DateTimeField(auto_now_add=True,null=True, blank=True)  
+    # Reference into the job output store (jobs/storage.py), the content itself stays on disk
+    output_digest=models.CharField(max_length=64,blank=True,default='')
+    output_size=models.BigIntegerField(default=0)
+    output_content_type=models.CharField(max_length=100,blank=True,default='')
     
 
 
@@ -0,0 +1,279 @@
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import pstats
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger('jobscheduler.profiling')
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Fraction of requests whose queries are recorded
+    'SAMPLE_RATE': 1.0,
+    # Fraction of recorded requests that also run under cProfile
+    'PYTHON_SAMPLE_RATE': 0.0,
+    'SLOW_REQUEST_MS': 500,
+    'SLOW_QUERY_MS': 100,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SLOWEST_QUERIES': 5,
+    'PYTHON_PROFILE_LINES': 25,
+}
+
+_current_profile = contextvars.ContextVar('sql_profile', default=None)
+# Only one cProfile session can be active per interpreter
+_python_profiler_lock = threading.Lock()
+_summary_lock = threading.Lock()
+_summary = {}
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SQL_PROFILING', {})}
+
+
+def normalize_sql(sql):
+    # Collapse literals so the same statement issued in a loop groups together
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return IN_LIST_RE.sub('(...)', sql)
+
+
+class RequestProfile:
+    def __init__(self, label, config):
+        self.label = label
+        self.config = config
+        self.queries = []
+        self.started = time.perf_counter()
+        # Whether the view should run under cProfile, decided when sampling
+        self.sample_python = False
+        self.python_profile = None
+
+    def record(self, sql, params, duration):
+        self.queries.append((sql, repr(params), duration))
+
+    def report(self):
+        config = self.config
+        duration_ms = (time.perf_counter() - self.started) * 1000
+
+        exact = Counter((sql, params) for sql, params, _ in self.queries)
+        patterns = Counter(normalize_sql(sql) for sql, _, _ in self.queries)
+        slowest = sorted(self.queries, key=lambda query: query[2], reverse=True)[:config['SLOWEST_QUERIES']]
+
+        report = {
+            'label': self.label,
+            'duration_ms': round(duration_ms, 2),
+            'query_count': len(self.queries),
+            'db_time_ms': round(sum(query[2] for query in self.queries) * 1000, 2),
+            # Parameters stay out of reports, they can hold usernames or session keys
+            'duplicates': [
+                {'sql': sql, 'count': count}
+                for (sql, _), count in exact.items() if count > 1
+            ],
+            'n_plus_one': [
+                {'sql': sql, 'count': count}
+                for sql, count in patterns.items() if count >= config['N_PLUS_ONE_THRESHOLD']
+            ],
+            'slowest': [
+                {'sql': sql, 'ms': round(duration * 1000, 2), 'slow': duration * 1000 >= config['SLOW_QUERY_MS']}
+                for sql, _, duration in slowest
+            ],
+        }
+        if self.python_profile is not None and duration_ms >= config['SLOW_REQUEST_MS']:
+            stream = io.StringIO()
+            stats = pstats.Stats(self.python_profile, stream=stream)
+            stats.sort_stats('cumulative').print_stats(config['PYTHON_PROFILE_LINES'])
+            report['python_profile'] = stream.getvalue()
+        return report
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record(sql, params, time.perf_counter() - start)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install():
+    if get_config()['ENABLED']:
+        connection_created.connect(install_query_recorder, dispatch_uid='jobs.profiling')
+        # Connections opened before profiling was switched on
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(None, connection)
+
+
+def add_to_summary(report):
+    with _summary_lock:
+        entry = _summary.setdefault(report['label'], {
+            'requests': 0,
+            'total_queries': 0,
+            'total_db_time_ms': 0.0,
+            'max_queries': 0,
+            'max_duration_ms': 0.0,
+            'n_plus_one_requests': 0,
+            'duplicate_requests': 0,
+            'slowest': deque(maxlen=5),
+        })
+        entry['requests'] += 1
+        entry['total_queries'] += report['query_count']
+        entry['total_db_time_ms'] += report['db_time_ms']
+        entry['max_queries'] = max(entry['max_queries'], report['query_count'])
+        entry['max_duration_ms'] = max(entry['max_duration_ms'], report['duration_ms'])
+        entry['n_plus_one_requests'] += bool(report['n_plus_one'])
+        entry['duplicate_requests'] += bool(report['duplicates'])
+        if report['slowest']:
+            entry['slowest'].append(report['slowest'][0])
+
+
+def get_summary():
+    """Aggregated figures for this process, endpoints with most DB time first."""
+    with _summary_lock:
+        rows = []
+        for label, entry in _summary.items():
+            rows.append({
+                'label': label,
+                'requests': entry['requests'],
+                'avg_queries': round(entry['total_queries'] / entry['requests'], 2),
+                'avg_db_time_ms': round(entry['total_db_time_ms'] / entry['requests'], 2),
+                'max_queries': entry['max_queries'],
+                'max_duration_ms': entry['max_duration_ms'],
+                'n_plus_one_requests': entry['n_plus_one_requests'],
+                'duplicate_requests': entry['duplicate_requests'],
+                'recent_slowest': list(entry['slowest']),
+            })
+    return sorted(rows, key=lambda row: row['avg_db_time_ms'] * row['requests'], reverse=True)
+
+
+def reset_summary():
+    with _summary_lock:
+        _summary.clear()
+
+
+@contextmanager
+def profiled(label, python=True):
+    """Records the queries run inside the block when the request is sampled.
+
+    Yields the RequestProfile, or None when profiling is off or the request
+    was not sampled. Unsampled blocks only cost a settings lookup and a
+    random() call. With python set, the profile may be picked for cProfile,
+    which PythonProfilingMiddleware then applies to the view.
+    """
+    config = get_config()
+    if not config['ENABLED'] or random.random() >= config['SAMPLE_RATE']:
+        yield None
+        return
+
+    profile = RequestProfile(label, config)
+    profile.sample_python = python and random.random() < config['PYTHON_SAMPLE_RATE']
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+        report = profile.report()
+        add_to_summary(report)
+        logger.info(json.dumps(report))
+
+
+def run_python_profiled(profile, func, *args, **kwargs):
+    # cProfile only follows the thread it is enabled in
+    if not _python_profiler_lock.acquire(blocking=False):
+        return func(*args, **kwargs)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        _python_profiler_lock.release()
+        profile.python_profile = profiler
+
+
+def request_label(request):
+    match = getattr(request, 'resolver_match', None)
+    return f'{request.method} /{match.route}' if match is not None else f'{request.method} {request.path}'
+
+
+class SQLProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_config()['ENABLED']:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with profiled(request.path) as profile:
+            response = self.get_response(request)
+            if profile is not None:
+                profile.label = request_label(request)
+        return response
+
+    async def __acall__(self, request):
+        with profiled(request.path) as profile:
+            response = await self.get_response(request)
+            if profile is not None:
+                profile.label = request_label(request)
+        return response
+
+
+class PythonProfilingMiddleware:
+    """Runs the rest of the request under cProfile when it was sampled for it.
+
+    Goes last in MIDDLEWARE, so the other middleware hooks (CSRF, exception
+    handling) still run as usual inside the profiled call. It is sync only on
+    purpose: under ASGI Django runs it in a worker thread, and sync views are
+    then executed in that same thread, the one cProfile can follow.
+    """
+
+    def __init__(self, get_response):
+        config = get_config()
+        if not config['ENABLED'] or not config['PYTHON_SAMPLE_RATE']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = _current_profile.get()
+        if profile is None or not profile.sample_python:
+            return self.get_response(request)
+        return run_python_profiled(profile, self.get_response, request)
+
+
+def profile_consumer(receive):
+    """Wraps a websocket consumer's receive so each message is profiled."""
+    @functools.wraps(receive)
+    async def wrapper(self, *args, **kwargs):
+        with profiled(f'WS {type(self).__name__}', python=False):
+            return await receive(self, *args, **kwargs)
+    return wrapper
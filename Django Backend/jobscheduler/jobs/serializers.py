@@ -31,4 +31,5 @@ class JobSerializer(serializers.ModelSerializer):
     class Meta:
         model=Job
         fields='__all__'
+        read_only_fields=['output_digest','output_size','output_content_type']
         print("serializer hit")
\ No newline at end of file
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import zlib
+from django.conf import settings
+
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+DEFAULT_COMPRESSION_LEVEL = 6
+
+
+class OutputWriter:
+    """Streams job output into the store.
+
+    Data is split into fixed size blocks and every block is compressed on its
+    own, so a byte range can later be served by inflating only the blocks it
+    touches. The file is named after the sha256 of the uncompressed content.
+    """
+
+    def __init__(self, store, job=None, content_type='application/octet-stream'):
+        self.store = store
+        self.job = job
+        self.content_type = content_type
+        os.makedirs(store.root, exist_ok=True)
+        self._tmp = tempfile.NamedTemporaryFile(dir=store.root, suffix='.tmp', delete=False)
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self._offsets = [0]
+        self.size = 0
+        self.digest = None
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._hash.update(data)
+        self.size += len(data)
+        self._buffer += data
+
+        block_size = self.store.block_size
+        while len(self._buffer) >= block_size:
+            self._flush_block(bytes(self._buffer[:block_size]))
+            del self._buffer[:block_size]
+
+    def _flush_block(self, block):
+        compressed = zlib.compress(block, self.store.level)
+        self._tmp.write(compressed)
+        self._offsets.append(self._offsets[-1] + len(compressed))
+
+    def close(self):
+        if self.digest is not None:
+            return self.digest
+        if self._buffer:
+            self._flush_block(bytes(self._buffer))
+            self._buffer.clear()
+        self._tmp.close()
+
+        self.digest = self._hash.hexdigest()
+        index = {
+            'size': self.size,
+            'block_size': self.store.block_size,
+            'offsets': self._offsets,
+        }
+        self.store._commit(self._tmp.name, self.digest, index)
+
+        if self.job is not None:
+            # Only the reference lives on the job row, the caller saves it
+            self.job.output_digest = self.digest
+            self.job.output_size = self.size
+            self.job.output_content_type = self.content_type
+        return self.digest
+
+    def abort(self):
+        self._tmp.close()
+        if os.path.exists(self._tmp.name):
+            os.unlink(self._tmp.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+            return False
+        self.close()
+        return False
+
+
+class OutputReader:
+    """Memory-mapped reader that inflates only the blocks a range needs."""
+
+    def __init__(self, path, index):
+        self.size = index['size']
+        self.block_size = index['block_size']
+        self.offsets = index['offsets']
+        self._file = open(path, 'rb')
+        # mmap refuses zero length files, an empty output has nothing to map
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else None
+
+    def iter_range(self, start=0, end=None):
+        # end is inclusive, like the HTTP Range header
+        if end is None or end >= self.size:
+            end = self.size - 1
+        if self.size == 0 or start > end:
+            return
+
+        first_block = start // self.block_size
+        last_block = end // self.block_size
+        for block in range(first_block, last_block + 1):
+            data = zlib.decompress(self._map[self.offsets[block]:self.offsets[block + 1]])
+            block_start = block * self.block_size
+            lo = max(start - block_start, 0)
+            hi = min(end - block_start + 1, len(data))
+            yield data[lo:hi]
+
+    def read(self, start=0, end=None):
+        return b''.join(self.iter_range(start, end))
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class JobOutputStore:
+    """Content-addressed, compressed file store for job outputs on local disk."""
+
+    def __init__(self, root=None, block_size=None, level=None):
+        self.root = str(root or getattr(settings, 'JOB_OUTPUT_ROOT', 'job_outputs'))
+        self.block_size = block_size or getattr(settings, 'JOB_OUTPUT_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+        self.level = level if level is not None else getattr(settings, 'JOB_OUTPUT_COMPRESSION_LEVEL', DEFAULT_COMPRESSION_LEVEL)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def index_path(self, digest):
+        return self.path(digest) + '.idx'
+
+    def exists(self, digest):
+        return bool(digest) and os.path.exists(self.index_path(digest))
+
+    def open_writer(self, job=None, content_type='application/octet-stream'):
+        return OutputWriter(self, job=job, content_type=content_type)
+
+    def _commit(self, tmp_path, digest, index):
+        if self.exists(digest):
+            # Same content is already stored, keep the existing copy
+            os.unlink(tmp_path)
+            return
+        directory = os.path.dirname(self.path(digest))
+        os.makedirs(directory, exist_ok=True)
+        self._publish(tmp_path, self.path(digest))
+        # The index is written last, a blob without it is treated as missing.
+        # Every writer gets its own temp file, several jobs can commit the
+        # same content at once
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+            json.dump(index, f)
+        self._publish(f.name, self.index_path(digest))
+
+    def _publish(self, tmp_path, path):
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another writer published the same content first
+            if not os.path.exists(path):
+                raise
+            os.unlink(tmp_path)
+
+    def read_index(self, digest):
+        with open(self.index_path(digest)) as f:
+            return json.load(f)
+
+    def open(self, digest):
+        return OutputReader(self.path(digest), self.read_index(digest))
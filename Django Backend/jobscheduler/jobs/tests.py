@@ -1,5 +1,5 @@
 import pytest
-from django.urls import reverse
+from django.urls import path, reverse
 from rest_framework.test import APIClient
 from rest_framework import status
  
@@ -47,4 +47,506 @@ def test_register_view_failure():
 
     assert 'username' in response.data
     assert 'email' in response.data
-    assert 'password' in response.data
\ No newline at end of file
+    assert 'password' in response.data
+
+def test_output_store_range_read(tmp_path):
+    from .storage import JobOutputStore
+    store = JobOutputStore(root=tmp_path, block_size=8)
+    data = b'job output line\n' * 20
+
+    with store.open_writer() as writer:
+        for i in range(0, len(data), 5):
+            writer.write(data[i:i + 5])
+
+    assert store.exists(writer.digest)
+    with store.open(writer.digest) as reader:
+        assert reader.read() == data
+        assert reader.read(10, 29) == data[10:30]
+        assert reader.read(len(data) - 3) == data[-3:]
+
+
+def test_output_store_deduplicates(tmp_path):
+    from .storage import JobOutputStore
+    store = JobOutputStore(root=tmp_path)
+
+    first = store.open_writer()
+    first.write('same result')
+    second = store.open_writer()
+    second.write('same result')
+
+    assert first.close() == second.close()
+    assert len(list(tmp_path.rglob('*.idx'))) == 1
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_output_store_concurrent_commits(tmp_path):
+    import threading
+    from .storage import JobOutputStore
+    store = JobOutputStore(root=tmp_path)
+
+    for round in range(100):
+        content = f'job{round} finished after 2 seconds\n'
+        writers = []
+        for _ in range(4):
+            writer = store.open_writer()
+            writer.write(content)
+            writers.append(writer)
+        barrier = threading.Barrier(len(writers))
+        errors = []
+
+        def commit(writer):
+            barrier.wait()
+            try:
+                writer.close()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=commit, args=(writer,)) for writer in writers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        with store.open(writers[0].digest) as reader:
+            assert reader.read() == content.encode()
+
+    assert not list(tmp_path.rglob('*.tmp'))
+
+def test_parse_range():
+    from .views import parse_range
+    assert parse_range(None, 100) is None
+    assert parse_range('bytes=10-19', 100) == (10, 19)
+    assert parse_range('bytes=90-', 100) == (90, 99)
+    assert parse_range('bytes=95-200', 100) == (95, 99)
+    assert parse_range('bytes=-5', 100) == (95, 99)
+    assert parse_range('bytes=-500', 100) == (0, 99)
+    assert parse_range('bytes=100-', 100) is False
+    assert parse_range('bytes=20-10', 100) is False
+    assert parse_range('bytes=-0', 100) is False
+    # Multiple ranges are not supported, the whole output is served instead
+    assert parse_range('bytes=0-1,5-6', 100) is None
+    assert parse_range('bytes=-5', 0) is False
+    assert parse_range('bytes=0-', 0) is False
+
+
+def create_job_with_output(settings, tmp_path, data):
+    from django.utils import timezone
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from .models import Job, User
+    from .storage import JobOutputStore
+    settings.JOB_OUTPUT_ROOT = tmp_path
+    settings.JOB_OUTPUT_BLOCK_SIZE = 16
+    user = User.objects.create_user(username='berlin', password='berlin123')
+    job = Job.objects.create(job_name='export', deadline=timezone.now(), user=user)
+    with JobOutputStore().open_writer(job, content_type='text/plain') as output:
+        output.write(data)
+    job.save()
+    token = str(RefreshToken.for_user(user).access_token)
+    return job, f'Bearer {token}'
+
+
+@pytest.mark.django_db
+def test_job_output_download(settings, tmp_path):
+    data = b'0123456789' * 10
+    job, auth = create_job_with_output(settings, tmp_path, data)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=auth)
+    url = reverse('job-output', args=[job.id])
+
+    response = client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert b''.join(response.streaming_content) == data
+    assert response['Accept-Ranges'] == 'bytes'
+
+    response = client.get(url, HTTP_RANGE='bytes=10-39')
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response['Content-Range'] == 'bytes 10-39/100'
+    assert b''.join(response.streaming_content) == data[10:40]
+
+    response = client.get(url, HTTP_RANGE='bytes=-5')
+    assert response['Content-Range'] == 'bytes 95-99/100'
+    assert b''.join(response.streaming_content) == data[-5:]
+
+    response = client.get(url, HTTP_RANGE='bytes=0-1,5-6')
+    assert response.status_code == status.HTTP_200_OK
+    assert b''.join(response.streaming_content) == data
+
+    response = client.get(url, HTTP_RANGE='bytes=100-')
+    assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+    assert response['Content-Range'] == 'bytes */100'
+
+
+@pytest.mark.django_db
+def test_job_output_download_empty(settings, tmp_path):
+    job, auth = create_job_with_output(settings, tmp_path, b'')
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=auth)
+    url = reverse('job-output', args=[job.id])
+
+    response = client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Length'] == '0'
+    assert b''.join(response.streaming_content) == b''
+
+    response = client.get(url, HTTP_RANGE='bytes=-5')
+    assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+    assert response['Content-Range'] == 'bytes */0'
+
+
+@pytest.mark.django_db
+def test_job_output_head_opens_nothing(settings, tmp_path, monkeypatch):
+    from .storage import JobOutputStore
+    job, auth = create_job_with_output(settings, tmp_path, b'0123456789')
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=auth)
+
+    def fail_open(self, digest):
+        raise AssertionError('the body of a HEAD response is never read')
+    monkeypatch.setattr(JobOutputStore, 'open', fail_open)
+
+    response = client.head(reverse('job-output', args=[job.id]))
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Length'] == '10'
+
+@pytest.mark.django_db
+def test_job_output_download_streams_under_asgi(settings, tmp_path):
+    from asgiref.sync import async_to_sync
+    from django.test import AsyncClient
+    data = b'abcdefghij' * 10
+    job, auth = create_job_with_output(settings, tmp_path, data)
+    client = AsyncClient()
+
+    async def download(headers):
+        response = await client.get(reverse('job-output', args=[job.id]), headers={'Authorization': auth, **headers})
+        chunks = [chunk async for chunk in response.streaming_content]
+        return response, chunks
+
+    response, chunks = async_to_sync(download)({'Range': 'bytes=5-44'})
+    # A sync iterator would be buffered whole by the ASGI handler
+    assert response.is_async
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert b''.join(chunks) == data[5:45]
+    # The blocks touched by the range are inflated and sent one by one
+    assert len(chunks) == 3
+
+
+def test_normalize_sql_groups_repeated_statements():
+    from .profiling import normalize_sql
+    first = normalize_sql("SELECT * FROM jobs_job WHERE user_id = 1 AND status = 'PENDING'")
+    second = normalize_sql("SELECT * FROM jobs_job WHERE user_id = 42 AND status = 'RUNNING'")
+    assert first == second
+
+
+@pytest.fixture
+def profile_log(tmp_path, monkeypatch):
+    # Keep reports out of the project's sql_profile.log
+    import json
+    import logging
+    from . import profiling
+    path = tmp_path / 'sql_profile.log'
+    monkeypatch.setattr(profiling.logger, 'handlers', [logging.FileHandler(path)])
+    profiling.reset_summary()
+
+    def reports():
+        for handler in profiling.logger.handlers:
+            handler.flush()
+        return [json.loads(line) for line in path.read_text().splitlines()]
+    return reports
+
+
+@pytest.mark.django_db
+def test_profiled_detects_n_plus_one(settings, profile_log):
+    import json
+    from .models import User
+    from . import profiling
+    settings.SQL_PROFILING = {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'N_PLUS_ONE_THRESHOLD': 3}
+    profiling.install()
+
+    with profiling.profiled('test'):
+        for user_id in range(4):
+            User.objects.filter(id=user_id).first()
+        User.objects.filter(username='secret-name').first()
+        User.objects.filter(username='secret-name').first()
+
+    report = profile_log()[0]
+    assert report['query_count'] == 6
+    assert len(report['n_plus_one']) == 1
+    assert report['duplicates'][0]['count'] == 2
+    # Query parameters never reach the log
+    assert 'secret-name' not in json.dumps(report)
+    assert profiling.get_summary()[0]['label'] == 'test'
+
+
+@pytest.mark.django_db
+def test_profiling_middleware_records_requests(settings, profile_log):
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from .models import User
+    settings.SQL_PROFILING = {'ENABLED': True, 'SAMPLE_RATE': 1.0}
+    user = User.objects.create_user(username='madrid', password='madrid123')
+    token = str(RefreshToken.for_user(user).access_token)
+
+    response = Client().get(reverse('job-list', args=[user.id]), HTTP_AUTHORIZATION=f'Bearer {token}')
+    assert response.status_code == status.HTTP_200_OK
+
+    report = profile_log()[0]
+    assert report['label'] == 'GET /api/joblist/<int:user_id>/'
+    # The user lookup for the token and the jobs query
+    assert report['query_count'] == 2
+    assert 'python_profile' not in report
+
+
+def csrf_protected_view(request):
+    from django.http import HttpResponse
+    return HttpResponse('ok')
+
+
+urlpatterns = [
+    path('csrf-check/', csrf_protected_view),
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.urls('jobs.tests')
+def test_python_profiling_keeps_csrf_checks(settings, profile_log):
+    from django.test import Client
+    settings.SQL_PROFILING = {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'PYTHON_SAMPLE_RATE': 1.0, 'SLOW_REQUEST_MS': 0}
+
+    response = Client(enforce_csrf_checks=True).post('/csrf-check/')
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    assert 'python_profile' in profile_log()[0]
+
+@pytest.mark.django_db
+def test_profiling_middleware_profiles_python_under_asgi(settings, profile_log):
+    from asgiref.sync import async_to_sync
+    from django.test import AsyncClient
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from .models import User
+    settings.SQL_PROFILING = {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'PYTHON_SAMPLE_RATE': 1.0, 'SLOW_REQUEST_MS': 0}
+    user = User.objects.create_user(username='rome', password='rome123')
+    token = str(RefreshToken.for_user(user).access_token)
+
+    response = async_to_sync(AsyncClient().get)(
+        reverse('job-list', args=[user.id]), headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == status.HTTP_200_OK
+
+    report = profile_log()[0]
+    assert report['query_count'] == 2
+    assert 'jobs/views.py' in report['python_profile']
+
+
+def run_async_get(url, token=None):
+    # Goes through the ASGI handler, sync ORM calls in the views would raise
+    # SynchronousOnlyOperation here
+    from asgiref.sync import async_to_sync
+    from django.test import AsyncClient
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    return async_to_sync(AsyncClient().get)(url, headers=headers)
+
+
+@pytest.mark.django_db
+def test_async_job_views():
+    from django.utils import timezone
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from .models import Job, User
+    user = User.objects.create_user(username='paris', password='paris123')
+    Job.objects.create(job_name='report', deadline=timezone.now(), user=user, status='COMPLETED', execution_time=4)
+    Job.objects.create(job_name='backup', deadline=timezone.now(), user=user, status='COMPLETED', execution_time=2)
+    Job.objects.create(job_name='cleanup', deadline=timezone.now(), user=user)
+    token = str(RefreshToken.for_user(user).access_token)
+
+    response = run_async_get(reverse('async-job-list'), token)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 3
+
+    response = run_async_get(reverse('async-user-jobs', args=[user.id]), token)
+    assert response.status_code == status.HTTP_200_OK
+    assert {job['job_name'] for job in response.json()} == {'report', 'backup', 'cleanup'}
+
+    response = run_async_get(reverse('async-job-stats', args=[user.id]), token)
+    assert response.json()['total'] == 3
+    assert response.json()['by_status'] == {'PENDING': 1, 'RUNNING': 0, 'FAILED': 0, 'COMPLETED': 2}
+    assert response.json()['avg_execution_time'] == 2
+
+    job = Job.objects.get(job_name='report')
+    response = run_async_get(reverse('async-job-detail', args=[job.id]), token)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['job_name'] == 'report'
+
+    response = run_async_get(reverse('async-job-detail', args=[job.id + 100]), token)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    response = run_async_get(reverse('async-job-list'))
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert response.json()['detail'] == 'Authentication credentials were not provided.'
+    assert response['WWW-Authenticate'] == 'Bearer realm="api"'
+
+    response = run_async_get(reverse('async-job-list'), 'not-a-token')
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert response.json()['code'] == 'token_not_valid'
+    assert response['WWW-Authenticate'] == 'Bearer realm="api"'
+
+
+@pytest.mark.django_db
+def test_sync_and_async_views_authenticate_alike(monkeypatch):
+    from rest_framework_simplejwt.settings import api_settings
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from .models import User
+    user = User.objects.create_user(username='vienna', password='vienna123', is_active=False)
+    token = str(RefreshToken.for_user(user).access_token)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    sync_url = reverse('job-list', args=[user.id])
+    async_url = reverse('async-user-jobs', args=[user.id])
+
+    assert client.get(sync_url).status_code == status.HTTP_401_UNAUTHORIZED
+    assert run_async_get(async_url, token).status_code == status.HTTP_401_UNAUTHORIZED
+
+    monkeypatch.setattr(api_settings, 'CHECK_USER_IS_ACTIVE', False)
+    assert client.get(sync_url).status_code == status.HTTP_200_OK
+    assert run_async_get(async_url, token).status_code == status.HTTP_200_OK
+
+    # The token carries no password hash claim, so the revoke check rejects it
+    monkeypatch.setattr(api_settings, 'CHECK_REVOKE_TOKEN', True)
+    assert client.get(sync_url).data['code'] == 'password_changed'
+    assert run_async_get(async_url, token).json()['code'] == 'password_changed'
+
+
+def test_columnar_frame_sends_field_names_once():
+    import json
+    from . import encoding
+    jobs = [
+        {'id': 1, 'job_name': 'report', 'status': 'COMPLETED'},
+        {'id': 2, 'job_name': 'backup', 'status': 'PENDING'},
+    ]
+    frame = encoding.encode_frame(encoding.COLUMNAR, [
+        {'action': 'get_all_jobs', 'jobs': jobs},
+        {'action': 'get_filtered_jobs', 'jobs': jobs[:1], 'total_pages': 2},
+    ])
+
+    messages = json.loads(frame['text_data'])['messages']
+    assert messages[0]['jobs']['columns'] == ['id', 'job_name', 'status']
+    assert messages[0]['jobs']['rows'][1] == [2, 'backup', 'PENDING']
+    assert messages[1]['total_pages'] == 2
+
+
+def test_negotiate_subprotocol():
+    from . import encoding
+    assert encoding.negotiate(['unknown', encoding.COLUMNAR]) == encoding.COLUMNAR
+    assert encoding.negotiate([]) is None
+
+
+def create_jobs_for_consumer(count):
+    from django.utils import timezone
+    from .models import Job, User
+    user = User.objects.create_user(username='lisbon', password='lisbon123')
+    for i in range(count):
+        Job.objects.create(job_name=f'job{i}', deadline=timezone.now(), user=user)
+    return user
+
+
+def run_consumer(path, subprotocols, conversation):
+    from asgiref.sync import async_to_sync
+    from channels.testing import WebsocketCommunicator
+    from jobscheduler.asgi import application
+
+    async def run():
+        communicator = WebsocketCommunicator(application, path, subprotocols=subprotocols)
+        connected, subprotocol = await communicator.connect()
+        assert connected
+        try:
+            return subprotocol, await conversation(communicator)
+        finally:
+            await communicator.disconnect()
+    return async_to_sync(run)()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_consumer_legacy_json():
+    user = create_jobs_for_consumer(3)
+
+    async def conversation(communicator):
+        await communicator.send_json_to({'action': 'get_filtered_jobs'})
+        return await communicator.receive_json_from()
+
+    subprotocol, message = run_consumer(f'/ws/jobs/ALL/{user.id}/2/2/', None, conversation)
+    assert subprotocol is None
+    assert message['action'] == 'get_filtered_jobs'
+    assert message['total_pages'] == 2
+    assert [job['job_name'] for job in message['jobs']] == ['job2']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_consumer_legacy_json_reports_failed_action():
+    user = create_jobs_for_consumer(2)
+
+    async def conversation(communicator):
+        await communicator.send_json_to({'action': 'get_filtered_jobs'})
+        error = await communicator.receive_json_from()
+        # The connection stays usable after the failure
+        await communicator.send_json_to({'action': 'get_all_jobs'})
+        return error, await communicator.receive_json_from()
+
+    # Page 9 is past the end, the paginator raises EmptyPage
+    _, (error, message) = run_consumer(f'/ws/jobs/ALL/{user.id}/9/5/', None, conversation)
+    assert error['action'] == 'get_filtered_jobs'
+    assert 'error' in error
+    assert len(message['jobs']) == 2
+
+@pytest.mark.django_db(transaction=True)
+def test_consumer_coalesces_columnar_frames():
+    from . import encoding
+    user = create_jobs_for_consumer(3)
+
+    async def conversation(communicator):
+        await communicator.send_json_to({'action': 'get_all_jobs'})
+        await communicator.send_json_to({'action': 'get_filtered_jobs'})
+        await communicator.send_json_to({'action': 'get_all_jobs'})
+        frame = await communicator.receive_json_from()
+        assert await communicator.receive_nothing()
+        return frame
+
+    subprotocol, frame = run_consumer(f'/ws/jobs/ALL/{user.id}/1/2/', ['unknown', encoding.COLUMNAR], conversation)
+    assert subprotocol == encoding.COLUMNAR
+    assert [message['action'] for message in frame['messages']] == ['get_all_jobs', 'get_filtered_jobs']
+    jobs = frame['messages'][0]['jobs']
+    assert 'job_name' in jobs['columns']
+    assert len(jobs['rows']) == 3
+    assert len(frame['messages'][1]['jobs']['rows']) == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_consumer_msgpack_round_trip():
+    msgpack = pytest.importorskip('msgpack')
+    from . import encoding
+    user = create_jobs_for_consumer(2)
+
+    async def conversation(communicator):
+        await communicator.send_to(bytes_data=msgpack.packb({'action': 'get_all_jobs'}))
+        return await communicator.receive_from()
+
+    subprotocol, data = run_consumer(f'/ws/jobs/ALL/{user.id}/1/5/', [encoding.MSGPACK], conversation)
+    assert subprotocol == encoding.MSGPACK
+    frame = msgpack.unpackb(data)
+    jobs = frame['messages'][0]['jobs']
+    name = jobs['columns'].index('job_name')
+    assert sorted(row[name] for row in jobs['rows']) == ['job0', 'job1']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_consumer_reports_failed_action_in_frame():
+    from . import encoding
+    user = create_jobs_for_consumer(2)
+
+    async def conversation(communicator):
+        await communicator.send_json_to({'action': 'get_all_jobs'})
+        await communicator.send_json_to({'action': 'get_filtered_jobs'})
+        return await communicator.receive_json_from()
+
+    # Page 9 is past the end, the paginator raises EmptyPage
+    subprotocol, frame = run_consumer(f'/ws/jobs/ALL/{user.id}/9/5/', [encoding.COLUMNAR], conversation)
+    all_jobs, filtered = frame['messages']
+    assert len(all_jobs['jobs']['rows']) == 2
+    assert filtered['action'] == 'get_filtered_jobs'
+    assert 'error' in filtered
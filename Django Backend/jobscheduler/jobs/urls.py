@@ -1,6 +1,7 @@
 from django.urls import path,include
 from rest_framework.routers import DefaultRouter
-from .views import JobViewset,RegisterView,LoginView,UserJobsView
+from .views import JobViewset,RegisterView,LoginView,UserJobsView,ProfilingSummaryView
+from .views import AsyncJobListView,AsyncJobDetailView,AsyncUserJobsView,AsyncJobStatsView
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -15,5 +16,10 @@ urlpatterns=[path('',include(router.urls)),
             path('register/',RegisterView.as_view(),name='user-register'),
             path('login/', LoginView.as_view(), name='user-login'),
             path('joblist/<int:user_id>/', UserJobsView.as_view(), name='job-list'),
+            path('profiling/summary/', ProfilingSummaryView.as_view(), name='profiling-summary'),
+            path('async/jobs/', AsyncJobListView.as_view(), name='async-job-list'),
+            path('async/jobs/<int:pk>/', AsyncJobDetailView.as_view(), name='async-job-detail'),
+            path('async/joblist/<int:user_id>/', AsyncUserJobsView.as_view(), name='async-user-jobs'),
+            path('async/stats/<int:user_id>/', AsyncJobStatsView.as_view(), name='async-job-stats'),
             #path('api/jobs/dashboard/<str:status>/', JobListView.as_view(), name='jobs-dashboard'),
             ]
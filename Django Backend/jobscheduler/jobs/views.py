@@ -11,15 +11,23 @@ from django.utils import timezone
 from drf_yasg import openapi
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.permissions import AllowAny,IsAuthenticated
+from rest_framework.permissions import AllowAny,IsAuthenticated,IsAdminUser
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from concurrent.futures import ThreadPoolExecutor
 import time
 from django.db.models import Case, When, Value, IntegerField
 import queue
 from rest_framework.pagination import PageNumberPagination
 from asgiref.sync import async_to_sync, sync_to_async
+from rest_framework.decorators import action
+from django.http import StreamingHttpResponse, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Avg, Count
+from rest_framework.exceptions import AuthenticationFailed
+from .authentication import JobsJWTAuthentication
+from .storage import JobOutputStore
+from . import profiling
+import re
 
 
 executor = ThreadPoolExecutor(max_workers=3)
@@ -29,10 +37,59 @@ running_jobs=[]
 
 
 PRIORITY_MAP = {"High": 3, "Medium": 2, "Low": 1}
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    # Returns (start, end) for a single byte range, None to serve the whole
+    # output and False when the range cannot be satisfied
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first == '' and last == '':
+        return None
+    if size == 0:
+        # An empty output has no byte a range could select
+        return False
+    if first == '':
+        # Suffix range, the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def stream_output(store, digest, start, end):
+    # The reader is opened on first iteration, a body that is never read
+    # (HEAD, early disconnect) leaves no file or mmap behind
+    with store.open(digest) as reader:
+        yield from reader.iter_range(start, end)
+
+
+async def astream_output(store, digest, start, end):
+    # Under ASGI a sync iterator would be collected into a list before the
+    # first byte is sent, so blocks are inflated one at a time off the loop
+    blocks = stream_output(store, digest, start, end)
+    inflate = sync_to_async(next, thread_sensitive=False)
+    try:
+        while True:
+            block = await inflate(blocks, None)
+            if block is None:
+                break
+            yield block
+    finally:
+        await sync_to_async(blocks.close, thread_sensitive=False)()
+
 class JobViewset(viewsets.ModelViewSet):
     queryset = Job.objects.all()
     serializer_class = JobSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [JobsJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
@@ -92,6 +149,10 @@ class JobViewset(viewsets.ModelViewSet):
             print(f"Running: {job.job_name} (Priority: {job.priority}, Deadline: {job.deadline})")
             time.sleep(job.estimated_duration)  # Simulate job execution
 
+            # Results go to the output store, the job row only keeps the reference
+            with JobOutputStore().open_writer(job, content_type='text/plain') as output:
+                output.write(f"{job.job_name} finished after {job.estimated_duration} seconds\n")
+
             # After job execution, mark it as completed
             job.status = "COMPLETED"
             job.end_time = timezone.now()
@@ -109,6 +170,33 @@ class JobViewset(viewsets.ModelViewSet):
         # After completing the job, recursively call process_jobs to check for new pending jobs
         self.process_jobs()
 
+    @action(detail=True, methods=['get'])
+    def output(self, request, pk=None):
+        job = self.get_object()
+        store = JobOutputStore()
+        if not store.exists(job.output_digest):
+            return Response({'message': 'No output for this job.'}, status=status.HTTP_404_NOT_FOUND)
+
+        size = job.output_size
+        byte_range = parse_range(request.headers.get('Range'), size)
+        if byte_range is False:
+            response = Response(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        start, end = byte_range or (0, size - 1)
+        stream = astream_output if isinstance(request._request, ASGIRequest) else stream_output
+        content = stream(store, job.output_digest, start, end)
+        if byte_range is None:
+            response = StreamingHttpResponse(content, content_type=job.output_content_type)
+        else:
+            response = StreamingHttpResponse(content, status=status.HTTP_206_PARTIAL_CONTENT, content_type=job.output_content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = max(end - start + 1, 0)
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = f'"{job.output_digest}"'
+        return response
+
 class RegisterView(APIView):
     permission_classes = [AllowAny]
 
@@ -182,4 +270,75 @@ class UserJobsView(APIView):
     def get(self, request, user_id):
         jobs = Job.objects.filter(user_id=user_id)
         serializer = JobSerializer(jobs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class ProfilingSummaryView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        # Figures are kept per process, each worker reports its own requests
+        return Response({
+            'enabled': profiling.get_config()['ENABLED'],
+            'endpoints': profiling.get_summary(),
+        }, status=status.HTTP_200_OK)
+
+
+# Native async read endpoints. They skip DRF, whose views are sync only, so
+# under ASGI a request is served on the event loop without a thread hop.
+jwt_authentication = JobsJWTAuthentication()
+
+
+class AsyncJWTView(View):
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user = await jwt_authentication.aauthenticate(request)
+        except AuthenticationFailed as exc:
+            detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+            return self.unauthorized(request, detail)
+        if user is None:
+            return self.unauthorized(request, {'detail': 'Authentication credentials were not provided.'})
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+    def unauthorized(self, request, detail):
+        response = JsonResponse(detail, status=status.HTTP_401_UNAUTHORIZED)
+        response['WWW-Authenticate'] = jwt_authentication.authenticate_header(request)
+        return response
+
+
+class AsyncJobListView(AsyncJWTView):
+    async def get(self, request):
+        jobs = [job async for job in Job.objects.all()]
+        serializer = JobSerializer(jobs, many=True)
+        return JsonResponse(serializer.data, safe=False)
+
+
+class AsyncJobDetailView(AsyncJWTView):
+    async def get(self, request, pk):
+        job = await Job.objects.filter(pk=pk).afirst()
+        if job is None:
+            return JsonResponse({'detail': 'No Job matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse(JobSerializer(job).data)
+
+
+class AsyncUserJobsView(AsyncJWTView):
+    async def get(self, request, user_id):
+        jobs = [job async for job in Job.objects.filter(user_id=user_id)]
+        serializer = JobSerializer(jobs, many=True)
+        return JsonResponse(serializer.data, safe=False)
+
+
+class AsyncJobStatsView(AsyncJWTView):
+    async def get(self, request, user_id):
+        jobs = Job.objects.filter(user_id=user_id)
+        by_status = {choice: 0 for choice, _ in Job.STATUS_CHOICES}
+        async for row in jobs.values('status').annotate(count=Count('id')).order_by():
+            by_status[row['status']] = row['count']
+
+        totals = await jobs.aaggregate(total=Count('id'), avg_execution_time=Avg('execution_time'))
+        return JsonResponse({
+            'total': totals['total'],
+            'by_status': by_status,
+            'avg_execution_time': totals['avg_execution_time'] or 0,
+        })
@@ -1,4 +1,5 @@
 import os
+import asyncio
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
@@ -7,6 +8,9 @@ import json
 from django.urls import re_path 
 from channels.db import database_sync_to_async
 from django.core.paginator import Paginator
+from django.conf import settings
+from jobs.profiling import profile_consumer
+from jobs import encoding
 
 
 
@@ -17,37 +21,76 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jobscheduler.settings')
 
 class SimpleConsumer(AsyncWebsocketConsumer):
     async def connect(self):        
-        await self.accept()
+        # Dashboards can ask for a compact wire format through the websocket subprotocol
+        self.subprotocol = encoding.negotiate(self.scope.get('subprotocols', []))
+        self.pending_actions = {}
+        self.flush_task = None
+        await self.accept(subprotocol=self.subprotocol)
 
     async def disconnect(self, close_code):
-        # Handle disconnection
-        pass
+        self.pending_actions = {}
+        if self.flush_task is not None:
+            self.flush_task.cancel()
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        data = encoding.decode_request(self.subprotocol, text_data, bytes_data)
         action = data.get("action")
-
+        if action not in ("get_all_jobs", "get_filtered_jobs"):
+            return
+
+        if self.subprotocol is None:
+            message = await self.build_message_or_error(action)
+            await self.send(text_data=json.dumps(message))
+            return
+
+        # Compact clients get every action of a tick in one frame, repeats of
+        # the same action within the tick are answered once
+        self.pending_actions[action] = True
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        await asyncio.sleep(getattr(settings, 'WEBSOCKET_COALESCE_MS', 50) / 1000)
+        actions = list(self.pending_actions)
+        self.pending_actions = {}
+        try:
+            messages = [await self.build_message_or_error(action) for action in actions]
+            await self.send(**encoding.encode_frame(self.subprotocol, messages))
+        finally:
+            # Actions that arrived while this frame was built go out on the next tick
+            self.flush_task = asyncio.create_task(self.flush()) if self.pending_actions else None
+
+    async def build_message_or_error(self, action):
+        # A failing action (e.g. a page past the end) is answered with an
+        # error entry instead of closing the socket or dropping the frame
+        try:
+            return await self.build_message(action)
+        except Exception as e:
+            print(f"Error while building {action}: {e}")
+            return {"action": action, "error": str(e)}
+
+    @profile_consumer
+    async def build_message(self, action):
         if action == "get_all_jobs":
             # Fetch all jobs for charts
             self.user = self.scope['url_route']['kwargs'].get('user', None)
             jobs = await self.get_all_jobs(self.user)
-            await self.send(text_data=json.dumps({
+            return {
                 "action": "get_all_jobs",
                 "jobs": jobs,
-            }))
-
-        elif action == "get_filtered_jobs":
-            # Fetch filtered and paginated jobs for the table
-            self.user = self.scope['url_route']['kwargs'].get('user', None)
-            self.status = self.scope['url_route']['kwargs'].get('status', None)
-            self.page = int(self.scope['url_route']['kwargs'].get('page', 1))
-            self.limit = int(self.scope['url_route']['kwargs'].get('limit', 5))
-            jobs, total_pages = await self.get_filtered_jobs(self.user, self.status, self.page, self.limit)
-            await self.send(text_data=json.dumps({
-                "action": "get_filtered_jobs",
-                "jobs": jobs,
-                "total_pages": total_pages,
-            }))
+            }
+
+        # Fetch filtered and paginated jobs for the table
+        self.user = self.scope['url_route']['kwargs'].get('user', None)
+        self.status = self.scope['url_route']['kwargs'].get('status', None)
+        self.page = int(self.scope['url_route']['kwargs'].get('page', 1))
+        self.limit = int(self.scope['url_route']['kwargs'].get('limit', 5))
+        jobs, total_pages = await self.get_filtered_jobs(self.user, self.status, self.page, self.limit)
+        return {
+            "action": "get_filtered_jobs",
+            "jobs": jobs,
+            "total_pages": total_pages,
+        }
 
     @database_sync_to_async
     def get_all_jobs(self,user):
@@ -65,14 +108,15 @@ class SimpleConsumer(AsyncWebsocketConsumer):
             job_set = Job.objects.filter(user=user)
         else:
             job_set = Job.objects.filter(user=user, status=status)
+        # Pages are only stable over an ordered queryset
+        job_set = job_set.order_by('id')
 
         paginator = Paginator(job_set, limit)
         total_pages = paginator.num_pages
         page_obj = paginator.page(page)
 
-        serializer = JobSerializer(job_set, many=True)
+        serializer = JobSerializer(page_obj.object_list, many=True)
         return serializer.data, total_pages
-        pass
 
 
 # Routing of the ASGI application
@@ -58,9 +58,12 @@ CHANNEL_LAYERS = {
     },
 } 
 
+# Clients on a compact subprotocol (jobs/encoding.py) get one frame per tick
+WEBSOCKET_COALESCE_MS = 50
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication', 
+        'jobs.authentication.JobsJWTAuthentication', 
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -102,6 +105,7 @@ SWAGGER_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    'jobs.profiling.SQLProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -110,6 +114,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Wraps only the view call, so it has to stay last
+    'jobs.profiling.PythonProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'jobscheduler.urls'
@@ -191,6 +197,46 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Job output store, see jobs/storage.py
+JOB_OUTPUT_ROOT = BASE_DIR / 'job_outputs'
+JOB_OUTPUT_BLOCK_SIZE = 1024 * 1024
+JOB_OUTPUT_COMPRESSION_LEVEL = 6
+
+
+# Per-request SQL profiling, see jobs/profiling.py
+# The middlewares remove themselves from the stack while ENABLED is False,
+# PythonProfilingMiddleware also while PYTHON_SAMPLE_RATE is 0
+SQL_PROFILING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 1.0,
+    'PYTHON_SAMPLE_RATE': 0.0,
+    'SLOW_REQUEST_MS': 500,
+    'SLOW_QUERY_MS': 100,
+    'N_PLUS_ONE_THRESHOLD': 5,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'sql_profile': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': BASE_DIR / 'sql_profile.log',
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'jobscheduler.profiling': {
+            'handlers': ['sql_profile'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+
 
 CORS_ALLOW_METHODS = [
     "GET",